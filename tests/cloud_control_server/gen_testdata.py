@@ -0,0 +1,27 @@
+import os
+
+import json
+from google.protobuf import json_format
+import task_pb2
+
+
+# testdata/tasks/*.json are the editable sources, simple_server.py only loads
+# the binary *.pb files generated from them. Rerun this after editing them.
+def convert_tasks():
+    script_directory = os.path.dirname(os.path.abspath(__file__))
+    task_directory_path = os.path.join(script_directory, "testdata", "tasks")
+
+    for file_name in sorted(os.listdir(task_directory_path)):
+        if file_name.endswith(".json"):
+            with open(os.path.join(task_directory_path, file_name), "r") as f:
+                task_data = json.load(f)
+            task = task_pb2.Task()
+            json_format.ParseDict(task_data["Task"], task)
+            pb_name = file_name[: -len(".json")] + ".pb"
+            with open(os.path.join(task_directory_path, pb_name), "wb") as f:
+                f.write(task.SerializeToString())
+            print("Generated", pb_name)
+
+
+if __name__ == "__main__":
+    convert_tasks()
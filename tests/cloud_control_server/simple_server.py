@@ -1,11 +1,16 @@
 import os
 
+import asyncio
+import functools
 import grpc
+import itertools
 import json
-from concurrent import futures
+import logging
+import time
 from grpc_reflection.v1alpha import reflection
 from google.protobuf import json_format
-from datetime import datetime, timezone
+from google.protobuf.internal import api_implementation
+from datetime import datetime
 import calendar
 import task_pb2
 import task_pb2_grpc
@@ -13,35 +18,73 @@ import notification_pb2
 import notification_pb2_grpc
 import timestamp_pb2
 
-# Simple in-memory database
+log = logging.getLogger(__name__)
+
+# Simple in-memory database. The server is single-threaded by design: every
+# handler is a coroutine running on the one grpc.aio event loop and never
+# awaits, so these dicts are never accessed concurrently and need no lock.
 TASK_DB = {}
 TASK_RUN_DB = {}
+# task_name -> serialized DescribeTaskResponse holding only that task. Its
+# task field has the same number as the repeated task fields of
+# ShowTasksResponse and GetTaskDependentsResponse, so the cached bytes of
+# several tasks can be concatenated into those responses as well.
+TASK_SERIALIZED = {}
+# task ids are never reused, even after DropTask. load_data_from_json moves
+# it past the ids of the testdata tasks
+NEXT_TASK_ID = itertools.count(1)
+# task_name -> root task ids, reset whenever the task graph changes
+ROOT_ID_CACHE = {}
 
 NOTIFICATION_DB = {}
 NOTIFICATION_HISTORY_DB = {}
 
+# the databend query keeps one HTTP/2 connection to the server, let it
+# multiplex many streams and keep it alive between test cases
+SERVER_OPTIONS = [
+    ("grpc.max_concurrent_streams", 1000),
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.so_reuseport", 1),
+    ("grpc.max_send_message_length", -1),
+    ("grpc.max_receive_message_length", -1),
+]
+
+SERVICE_NAMES = (
+    task_pb2.DESCRIPTOR.services_by_name["TaskService"].full_name,
+    notification_pb2.DESCRIPTOR.services_by_name["NotificationService"].full_name,
+    reflection.SERVICE_NAME,
+)
+
 
 def load_data_from_json():
+    global NEXT_TASK_ID
     script_directory = os.path.dirname(os.path.abspath(__file__))
     task_directory_path = os.path.join(script_directory, "testdata", "tasks")
 
-    for file_name in os.listdir(task_directory_path):
-        if file_name.endswith(".json"):
-            with open(os.path.join(task_directory_path, file_name), "r") as f:
-                task_run_data = json.load(f)
-                task = task_pb2.Task()
-                json_format.ParseDict(task_run_data["Task"], task)
+    # tasks are loaded from the binary *.pb files generated by gen_testdata.py
+    with os.scandir(task_directory_path) as entries:
+        for entry in entries:
+            if entry.name.endswith(".pb"):
+                with open(entry.path, "rb") as f:
+                    task = task_pb2.Task.FromString(f.read())
                 TASK_DB[task.task_name] = task
+                cache_task(task)
+    if len(TASK_DB) == 0:
+        raise RuntimeError(
+            f"no task testdata in {task_directory_path}, run gen_testdata.py first"
+        )
+    # created tasks must not reuse the ids of the testdata tasks
+    NEXT_TASK_ID = itertools.count(max(t.task_id for t in TASK_DB.values()) + 1)
     TASK_RUN_DB["MockTask"] = create_mock_task_runs_from_task(TASK_DB["SampleTask"], 10)
     notification_history_directory_path = os.path.join(
         script_directory, "testdata", "notification_history"
     )
-    for file_name in os.listdir(notification_history_directory_path):
-        if file_name.endswith(".json"):
-            with open(
-                os.path.join(notification_history_directory_path, file_name), "r"
-            ) as f:
-                notification_history_data = json.load(f)
+    with os.scandir(notification_history_directory_path) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json"):
+                with open(entry.path, "r") as f:
+                    notification_history_data = json.load(f)
                 notification_history = notification_pb2.NotificationHistory()
                 json_format.ParseDict(notification_history_data, notification_history)
                 NOTIFICATION_HISTORY_DB[notification_history.name] = (
@@ -49,6 +92,25 @@ def load_data_from_json():
                 )
 
 
+@functools.lru_cache(maxsize=1)
+def utc_seconds_to_iso(seconds):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds))
+
+
+def now_iso():
+    # RFC 3339 UTC timestamp with microseconds, the formatted seconds part is
+    # reused for all calls within the same second
+    seconds, nanos = divmod(time.time_ns(), 1_000_000_000)
+    return f"{utc_seconds_to_iso(seconds)}.{nanos // 1000:06d}Z"
+
+
+def cache_task(task):
+    # must be called after every change to a task in TASK_DB
+    TASK_SERIALIZED[task.task_name] = task_pb2.DescribeTaskResponse(
+        task=task
+    ).SerializeToString()
+
+
 def create_task_request_to_task(id, create_task_request):
     # Convert CreateTaskRequest to dictionary
     task = task_pb2.Task()
@@ -75,10 +137,12 @@ def create_task_request_to_task(id, create_task_request):
         else ""
     )
     task.after.extend(create_task_request.after)
-    task.created_at = datetime.now(timezone.utc).isoformat()
-    task.updated_at = datetime.now(timezone.utc).isoformat()
+    now = now_iso()
+    task.created_at = now
+    task.updated_at = now
     # add session parameters
-    task.session_parameters.update(create_task_request.session_parameters)
+    if len(create_task_request.session_parameters) > 0:
+        task.session_parameters.update(create_task_request.session_parameters)
     return task
 
 
@@ -108,54 +172,171 @@ def create_notification_request_to_notification(id, create_notification_request)
 
 
 def get_root_task_id(task):
-    if len(task.after) == 0:
-        return str(task.task_id)
-    else:
-        root_ids = []
-        for prev_task in task.after:
-            root_ids.append(get_root_task_id(TASK_DB[prev_task]))
-
-        dedup = list(set(root_ids))
-        return ",".join(dedup)
-
-
-def create_task_run_from_task(task):
+    root_id = ROOT_ID_CACHE.get(task.task_name)
+    if root_id is not None:
+        return root_id
+    # walk up the DAG with an explicit stack, visiting every task once
+    root_ids = set()
+    visited = {task.task_name}
+    stack = [task]
+    while stack:
+        current = stack.pop()
+        if len(current.after) == 0:
+            root_ids.add(str(current.task_id))
+            continue
+        for prev_task in current.after:
+            if prev_task not in visited:
+                visited.add(prev_task)
+                stack.append(TASK_DB[prev_task])
+    root_id = ",".join(sorted(root_ids))
+    ROOT_ID_CACHE[task.task_name] = root_id
+    return root_id
+
+
+def create_task_run_from_task(task, now, root_id):
     task_run = task_pb2.TaskRun()
     task_run.task_id = task.task_id
     task_run.task_name = task.task_name
     task_run.owner = task.owner
     task_run.query_text = task.query_text
-    task_run.schedule_options.CopyFrom(task.schedule_options)
-    task_run.warehouse_options.CopyFrom(task.warehouse_options)
-    task_run.condition_text = task.when_condition
-    task_run.root_task_id = str(get_root_task_id(task))
-
+    if task.HasField("schedule_options"):
+        task_run.schedule_options.CopyFrom(task.schedule_options)
+    if task.HasField("warehouse_options"):
+        task_run.warehouse_options.CopyFrom(task.warehouse_options)
+    if task.HasField("when_condition"):
+        task_run.condition_text = task.when_condition
+    task_run.root_task_id = root_id
+
+    # attempt_number and error_code stay at their default 0
     task_run.state = task_pb2.TaskRun.SUCCEEDED
-    task_run.attempt_number = 0
-    task_run.comment = task.comment
-    task_run.error_code = 0
+    if task.HasField("comment"):
+        task_run.comment = task.comment
     task_run.error_message = ""
     task_run.run_id = "1ftx"
     task_run.query_id = "qwert"
-    task_run.scheduled_time = datetime.now(timezone.utc).isoformat()
-    task_run.completed_time = datetime.now(timezone.utc).isoformat()
-    task_run.session_parameters.update(task.session_parameters)
+    task_run.scheduled_time = now
+    task_run.completed_time = now
+    if len(task.session_parameters) > 0:
+        task_run.session_parameters.update(task.session_parameters)
     return task_run
 
 
 def create_mock_task_runs_from_task(task, num):
     task_runs = []
+    now = now_iso()
+    root_id = get_root_task_id(task)
     for i in range(0, num):
-        task_run = create_task_run_from_task(task)
+        task_run = create_task_run_from_task(task, now, root_id)
         task_run.task_name = "MockTask"
         task_run.run_id = "1ftx" + str(i)
         task_runs.append(task_run)
     return task_runs
 
 
+def alter_task_suspend(task, request):
+    task.status = task_pb2.Task.Suspended
+
+
+def alter_task_resume(task, request):
+    task.status = task_pb2.Task.Started
+
+
+def alter_task_modify_as(task, request):
+    if not request.HasField("query_text"):
+        return task_pb2.TaskError(
+            kind="INVALID_ARGUMENT",
+            message="query_text not provided for MODIFY_AS",
+            code=7,
+        )
+    task.query_text = request.query_text
+
+
+def alter_task_modify_when(task, request):
+    if not request.HasField("when_condition"):
+        return task_pb2.TaskError(
+            kind="INVALID_ARGUMENT",
+            message="when_condition not provided for MODIFY_WHEN",
+            code=7,
+        )
+    task.when_condition = request.when_condition
+
+
+def alter_task_add_after(task, request):
+    if len(request.add_after) == 0:
+        return task_pb2.TaskError(
+            kind="INVALID_ARGUMENT",
+            message="add_after not provided for ADD_AFTER",
+            code=7,
+        )
+    task.after.extend(request.add_after)
+    ROOT_ID_CACHE.clear()
+
+
+def alter_task_remove_after(task, request):
+    if len(request.remove_after) == 0:
+        return task_pb2.TaskError(
+            kind="INVALID_ARGUMENT",
+            message="remove_after not provided for REMOVE_AFTER",
+            code=7,
+        )
+    remove_after = set(request.remove_after)
+    filtered_array = [elem for elem in task.after if elem not in remove_after]
+    task.ClearField("after")
+    task.after.extend(filtered_array)
+    ROOT_ID_CACHE.clear()
+
+
+def alter_task_set(task, request):
+    has_options = False
+    if request.HasField("schedule_options"):
+        task.schedule_options.CopyFrom(request.schedule_options)
+        has_options = True
+    if request.HasField("warehouse_options"):
+        task.warehouse_options.CopyFrom(request.warehouse_options)
+        has_options = True
+    if request.HasField("comment"):
+        task.comment = request.comment
+        has_options = True
+    if request.HasField("suspend_task_after_num_failures"):
+        task.suspend_task_after_num_failures = request.suspend_task_after_num_failures
+        has_options = True
+    if request.HasField("error_integration"):
+        task.error_integration = request.error_integration
+        has_options = True
+    if request.set_session_parameters:
+        task.session_parameters.update(request.session_parameters)
+        has_options = True
+    if has_options is False:
+        return task_pb2.TaskError(
+            kind="INVALID_ARGUMENT",
+            message="No options provided for SET",
+            code=8,
+        )
+
+
+def alter_task_unsupported(task, request):
+    return task_pb2.TaskError(
+        kind="INVALID_ARGUMENT",
+        message="AlterTaskType not supported",
+        code=3,
+    )
+
+
+# AlterTaskType -> handler, returns a TaskError if the request is invalid
+ALTER_TASK_HANDLERS = {
+    task_pb2.AlterTaskRequest.Suspend: alter_task_suspend,
+    task_pb2.AlterTaskRequest.Resume: alter_task_resume,
+    task_pb2.AlterTaskRequest.ModifyAs: alter_task_modify_as,
+    task_pb2.AlterTaskRequest.ModifyWhen: alter_task_modify_when,
+    task_pb2.AlterTaskRequest.AddAfter: alter_task_add_after,
+    task_pb2.AlterTaskRequest.RemoveAfter: alter_task_remove_after,
+    task_pb2.AlterTaskRequest.Set: alter_task_set,
+}
+
+
 class TaskService(task_pb2_grpc.TaskServiceServicer):
-    def CreateTask(self, request, context):
-        print("CreateTask", request)
+    async def CreateTask(self, request, context):
+        log.debug("CreateTask %s", request)
         task_name = request.task_name
         if task_name in TASK_DB and request.if_not_exist is False:
             return task_pb2.CreateTaskResponse(
@@ -163,13 +344,15 @@ class TaskService(task_pb2_grpc.TaskServiceServicer):
                     kind="ALREADY_EXISTS", message="Task already exists", code=6
                 )
             )
-        task_id = len(TASK_DB) + 1
+        task_id = next(NEXT_TASK_ID)
         TASK_DB[task_name] = create_task_request_to_task(task_id, request)
+        cache_task(TASK_DB[task_name])
+        ROOT_ID_CACHE.clear()
 
         return task_pb2.CreateTaskResponse(task_id=task_id)
 
-    def DescribeTask(self, request, context):
-        print("DescribeTask", request)
+    async def DescribeTask(self, request, context):
+        log.debug("DescribeTask %s", request)
         task_name = request.task_name
         if task_name not in TASK_DB:
             return task_pb2.DescribeTaskResponse(
@@ -177,19 +360,20 @@ class TaskService(task_pb2_grpc.TaskServiceServicer):
                     kind="NOT_FOUND", message="Task not found", code=5
                 )
             )
-        task = TASK_DB[task_name]
-        return task_pb2.DescribeTaskResponse(task=task)
+        return task_pb2.DescribeTaskResponse.FromString(TASK_SERIALIZED[task_name])
 
-    def DropTask(self, request, context):
-        print("DropTask", request)
+    async def DropTask(self, request, context):
+        log.debug("DropTask %s", request)
         task_name = request.task_name
         if task_name not in TASK_DB:
             return task_pb2.DropTaskResponse()
         del TASK_DB[task_name]
+        del TASK_SERIALIZED[task_name]
+        ROOT_ID_CACHE.clear()
         return task_pb2.DropTaskResponse()
 
-    def AlterTask(self, request, context):
-        print("AlterTask", request)
+    async def AlterTask(self, request, context):
+        log.debug("AlterTask %s", request)
         task_name = request.task_name
         if task_name not in TASK_DB:
             return task_pb2.AlterTaskResponse(
@@ -198,179 +382,89 @@ class TaskService(task_pb2_grpc.TaskServiceServicer):
                 )
             )
         task = TASK_DB[task_name]
-        if request.alter_task_type == task_pb2.AlterTaskRequest.Suspend:
-            task.status = task_pb2.Task.Suspended
-        elif request.alter_task_type == task_pb2.AlterTaskRequest.Resume:
-            task.status = task_pb2.Task.Started
-        elif request.alter_task_type == task_pb2.AlterTaskRequest.ModifyAs:
-            if request.HasField("query_text"):
-                task.query_text = request.query_text
-            else:
-                return task_pb2.AlterTaskResponse(
-                    error=task_pb2.TaskError(
-                        kind="INVALID_ARGUMENT",
-                        message="query_text not provided for MODIFY_AS",
-                        code=7,
-                    )
-                )
-        elif request.alter_task_type == task_pb2.AlterTaskRequest.ModifyWhen:
-            if request.HasField("when_condition"):
-                task.when_condition = request.when_condition
-            else:
-                return task_pb2.AlterTaskResponse(
-                    error=task_pb2.TaskError(
-                        kind="INVALID_ARGUMENT",
-                        message="when_condition not provided for MODIFY_WHEN",
-                        code=7,
-                    )
-                )
-        elif request.alter_task_type == task_pb2.AlterTaskRequest.AddAfter:
-            if len(request.add_after) > 0:
-                task.after.extend(request.add_after)
-            else:
-                return task_pb2.AlterTaskResponse(
-                    error=task_pb2.TaskError(
-                        kind="INVALID_ARGUMENT",
-                        message="add_after not provided for ADD_AFTER",
-                        code=7,
-                    )
-                )
-        elif request.alter_task_type == task_pb2.AlterTaskRequest.RemoveAfter:
-            after = task.after
-            print(request)
-            if len(request.remove_after) > 0:
-                filtered_array = [
-                    elem for elem in after if elem not in request.remove_after
-                ]
-                task.after[:] = []
-                task.after.extend(filtered_array)
-            else:
-                return task_pb2.AlterTaskResponse(
-                    error=task_pb2.TaskError(
-                        kind="INVALID_ARGUMENT",
-                        message="remove_after not provided for REMOVE_AFTER",
-                        code=7,
-                    )
-                )
-        elif request.alter_task_type == task_pb2.AlterTaskRequest.Set:
-            has_options = False
-            if request.HasField("schedule_options"):
-                task.schedule_options.CopyFrom(request.schedule_options)
-                has_options = True
-            if request.HasField("warehouse_options"):
-                task.warehouse_options.CopyFrom(request.warehouse_options)
-                has_options = True
-            if request.HasField("comment"):
-                task.comment = request.comment
-                has_options = True
-            if request.HasField("suspend_task_after_num_failures"):
-                task.suspend_task_after_num_failures = (
-                    request.suspend_task_after_num_failures
-                )
-                has_options = True
-            if request.HasField("error_integration"):
-                task.error_integration = request.error_integration
-                has_options = True
-            if request.set_session_parameters:
-                task.session_parameters.update(request.session_parameters)
-                has_options = True
-            if has_options is False:
-                return task_pb2.AlterTaskResponse(
-                    error=task_pb2.TaskError(
-                        kind="INVALID_ARGUMENT",
-                        message="No options provided for SET",
-                        code=8,
-                    )
-                )
-        else:
-            # not supported
-            return task_pb2.AlterTaskResponse(
-                error=task_pb2.TaskError(
-                    kind="INVALID_ARGUMENT",
-                    message="AlterTaskType not supported",
-                    code=3,
-                )
-            )
-        current_time = datetime.now(timezone.utc)
-        current_time = current_time.isoformat()
-        task.updated_at = current_time
-        task_name = task.task_name
-        TASK_DB[task_name] = task
+        alter = ALTER_TASK_HANDLERS.get(request.alter_task_type, alter_task_unsupported)
+        error = alter(task, request)
+        if error is not None:
+            return task_pb2.AlterTaskResponse(error=error)
+        task.updated_at = now_iso()
+        cache_task(task)
         return task_pb2.AlterTaskResponse(task=task)
 
-    def ExecuteTask(self, request, context):
-        print("ExecuteTask", request)
+    async def ExecuteTask(self, request, context):
+        log.debug("ExecuteTask %s", request)
+        now = now_iso()
         for task_name, task in TASK_DB.items():
-            TASK_RUN_DB[task_name] = [create_task_run_from_task(task)]
+            TASK_RUN_DB[task_name] = [
+                create_task_run_from_task(task, now, get_root_task_id(task))
+            ]
         return task_pb2.ExecuteTaskResponse(error=None)
 
-    def ShowTasks(self, request, context):
-        print("ShowTasks", request)
-        tasks = list(TASK_DB.values())
-        return task_pb2.ShowTasksResponse(tasks=tasks)
+    async def ShowTasks(self, request, context):
+        log.debug("ShowTasks %s", request)
+        return task_pb2.ShowTasksResponse.FromString(b"".join(TASK_SERIALIZED.values()))
 
-    def ShowTaskRuns(self, request, context):
-        print("ShowTaskRuns", request)
-        task_runs = [item for sublist in TASK_RUN_DB.values() for item in sublist]
-        task_runs = sorted(task_runs, key=lambda x: x.run_id)
-        num_results = len(task_runs)
+    async def ShowTaskRuns(self, request, context):
+        log.debug("ShowTaskRuns %s", request)
+        task_runs = itertools.chain.from_iterable(TASK_RUN_DB.values())
+        num_results = sum(len(runs) for runs in TASK_RUN_DB.values())
 
         if len(request.task_name) > 0:
-            print("Limiting task_name to", request.task_name)
-            task_runs = list(
-                filter(lambda x: x.task_name == request.task_name, task_runs)
-            )
-        # limit and sort by run_id
+            log.debug("Limiting task_name to %s", request.task_name)
+            task_runs = (x for x in task_runs if x.task_name == request.task_name)
+        # sort by run_id, only the runs left after filtering are materialized
+        task_runs = sorted(task_runs, key=lambda x: x.run_id)
+        end_limit = len(task_runs)
+        # limit
         if request.result_limit > 0:
-            print("Limiting result to", request.result_limit)
-            task_runs = task_runs[: request.result_limit]
+            log.debug("Limiting result to %s", request.result_limit)
+            end_limit = request.result_limit
             if request.result_limit < num_results:
                 num_results = request.result_limit
         # pagination
         start_index = 0
         page_size = 2
         if request.HasField("next_page_token"):
-            print("Next page token", request.next_page_token)
+            log.debug("Next page token %s", request.next_page_token)
             start_index = request.next_page_token
 
         end_index = start_index + page_size
         next_page_token = end_index
         if end_index > num_results:
             next_page_token = None
-        task_runs = task_runs[start_index:end_index]
-        return task_pb2.ShowTaskRunsResponse(
-            task_runs=task_runs, next_page_token=next_page_token
-        )
+        # only the requested page is copied into the response
+        response = task_pb2.ShowTaskRunsResponse(next_page_token=next_page_token)
+        response.task_runs.extend(task_runs[:end_limit][start_index:end_index])
+        return response
 
-    def GetTaskDependents(self, request, context):
-        print("GetTaskDependents", request)
+    async def GetTaskDependents(self, request, context):
+        log.debug("GetTaskDependents %s", request)
         task_name = request.task_name
         if task_name not in TASK_DB:
             return task_pb2.GetTaskDependentsResponse(task=[])
-        task = TASK_DB[task_name]
-        root = task
-        l = [root]
-        if request.recursive is False:
-            return task_pb2.GetTaskDependentsResponse(task=l)
-
-        while len(root.after) > 0:
-            root = TASK_DB[root.after[0]]
-            l.insert(0, root)
-        return task_pb2.GetTaskDependentsResponse(task=l)
-
-    def EnableTaskDependents(self, request, context):
-        print("EnableTaskDependents", request)
+        root = TASK_DB[task_name]
+        l = [task_name]
+        if request.recursive:
+            while len(root.after) > 0:
+                root = TASK_DB[root.after[0]]
+                l.insert(0, root.task_name)
+        return task_pb2.GetTaskDependentsResponse.FromString(
+            b"".join(TASK_SERIALIZED[name] for name in l)
+        )
+
+    async def EnableTaskDependents(self, request, context):
+        log.debug("EnableTaskDependents %s", request)
         task_name = request.task_name
         if task_name not in TASK_DB:
             return task_pb2.EnableTaskDependentsResponse()
         task = TASK_DB[task_name]
         task.status = task_pb2.Task.Started
+        cache_task(task)
         return task_pb2.EnableTaskDependentsResponse()
 
 
 class NotificationService(notification_pb2_grpc.NotificationServiceServicer):
-    def CreateNotification(self, request, context):
-        print("CreateTask", request)
+    async def CreateNotification(self, request, context):
+        log.debug("CreateNotification %s", request)
         name = request.name
         if name in NOTIFICATION_DB and request.if_not_exists is False:
             return notification_pb2.CreateNotificationResponse(
@@ -386,8 +480,8 @@ class NotificationService(notification_pb2_grpc.NotificationServiceServicer):
             notification_id=notification_id
         )
 
-    def GetNotification(self, request, context):
-        print("GetNotification", request)
+    async def GetNotification(self, request, context):
+        log.debug("GetNotification %s", request)
         name = request.name
         if name not in NOTIFICATION_DB:
             return notification_pb2.GetNotificationResponse(
@@ -398,13 +492,14 @@ class NotificationService(notification_pb2_grpc.NotificationServiceServicer):
         notification = NOTIFICATION_DB[name]
         return notification_pb2.GetNotificationResponse(notification=notification)
 
-    def ListNotification(self, request, context):
-        print("ListNotification", request)
-        notifications = list(NOTIFICATION_DB.values())
-        return notification_pb2.ListNotificationResponse(notifications=notifications)
+    async def ListNotification(self, request, context):
+        log.debug("ListNotification %s", request)
+        response = notification_pb2.ListNotificationResponse()
+        response.notifications.extend(NOTIFICATION_DB.values())
+        return response
 
-    def AlterNotification(self, request, context):
-        print("AlterNotification", request)
+    async def AlterNotification(self, request, context):
+        log.debug("AlterNotification %s", request)
         name = request.name
         if name not in NOTIFICATION_DB:
             return notification_pb2.AlterNotificationResponse(
@@ -430,23 +525,23 @@ class NotificationService(notification_pb2_grpc.NotificationServiceServicer):
             notification_id=notification.notification_id
         )
 
-    def DropNotification(self, request, context):
-        print("DropNotification", request)
+    async def DropNotification(self, request, context):
+        log.debug("DropNotification %s", request)
         name = request.name
         if name not in NOTIFICATION_DB:
             return notification_pb2.DropNotificationResponse()
         del NOTIFICATION_DB[name]
         return notification_pb2.DropNotificationResponse()
 
-    def ListNotificationHistory(self, request, context):
-        print("ListNotificationHistory", request)
+    async def ListNotificationHistory(self, request, context):
+        log.debug("ListNotificationHistory %s", request)
         notification_histories = list(NOTIFICATION_HISTORY_DB.values())
 
         if (
             request.HasField("result_limit")
             and len(notification_histories) > request.result_limit
         ):
-            print("Limiting result to", request.result_limit)
+            log.debug("Limiting result to %s", request.result_limit)
             notification_histories = notification_histories[: request.result_limit]
         return notification_pb2.ListNotificationHistoryResponse(
             notification_histories=notification_histories
@@ -458,26 +553,37 @@ def timestamp_to_datetime(timestamp):
     return datetime.fromtimestamp(timestamp.seconds + timestamp.nanos / 1e9)
 
 
-def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=20))
+async def serve():
+    # no thread pool: all handlers are async and run on this event loop
+    server = grpc.aio.server(options=SERVER_OPTIONS)
     task_pb2_grpc.add_TaskServiceServicer_to_server(TaskService(), server)
     notification_pb2_grpc.add_NotificationServiceServicer_to_server(
         NotificationService(), server
     )
-    # Add reflection service
-    SERVICE_NAMES = (
-        task_pb2.DESCRIPTOR.services_by_name["TaskService"].full_name,
-        notification_pb2.DESCRIPTOR.services_by_name["NotificationService"].full_name,
-        reflection.SERVICE_NAME,
-    )
-    reflection.enable_server_reflection(SERVICE_NAMES, server)
+    # Add reflection service, only needed for debugging with e.g. grpcurl
+    if os.environ.get("ENABLE_REFLECTION"):
+        reflection.enable_server_reflection(SERVICE_NAMES, server)
 
     server.add_insecure_port("[::]:50051")
-    server.start()
+    await server.start()
     print("Server Started at port 50051")
-    server.wait_for_termination()
+    await server.wait_for_termination()
+
+
+def check_protobuf_implementation():
+    # the pure python protobuf backend is orders of magnitude slower, make sure
+    # the native (upb or cpp) one is in use, see README.md
+    implementation = api_implementation.Type()
+    if implementation not in ("upb", "cpp"):
+        raise RuntimeError(
+            f"protobuf native implementation required, got {implementation!r}"
+        )
 
 
 if __name__ == "__main__":
+    # set LOG_LEVEL=DEBUG to log every request
+    logging.basicConfig()
+    log.setLevel(os.environ.get("LOG_LEVEL", "WARNING"))
+    check_protobuf_implementation()
     load_data_from_json()
-    serve()
+    asyncio.run(serve())